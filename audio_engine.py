@@ -0,0 +1,154 @@
+import os
+import subprocess
+import tempfile
+import threading
+import numpy as np
+
+# Polly's long-form mp3 output is 24 kHz mono
+DEFAULT_SAMPLE_RATE = 24000
+TARGET_DBFS = -20.0
+CROSSFADE_MS = 10
+ENCODE_CHUNK_SAMPLES = 1 << 16
+
+
+class PcmEngine:
+    """
+    NumPy based stitcher. Every part is decoded (and resampled) by ffmpeg straight
+    to raw PCM on disk, then copied into one preallocated float32 buffer at its exact
+    offset. Loudness normalization and short edge fades are applied in place, and the
+    result is encoded once, optionally streamed to an uploader.
+
+    The fades only become a true crossfade when parts are stitched with no gap
+    (dialogue_gap_ms=0), where neighbours overlap by crossfade_ms. Podcast always
+    leaves a gap between turns, so there they act as de-click fades into silence.
+    """
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, target_dbfs=TARGET_DBFS, crossfade_ms=CROSSFADE_MS):
+        self.sample_rate = sample_rate
+        self.target_dbfs = target_dbfs
+        self.crossfade_ms = crossfade_ms
+
+    def decode_to_raw(self, audio_path, raw_path):
+        """Decode any ffmpeg-readable file to mono s16le at the engine sample rate"""
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-i", audio_path,
+             "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(self.sample_rate), raw_path],
+            check=True
+        )
+        # 2 bytes per int16 sample
+        return os.path.getsize(raw_path) // 2
+
+    def normalize(self, samples):
+        """Scale a segment in place to the target RMS level without clipping"""
+        rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+        if rms == 0:
+            return samples
+        gain = 10 ** (self.target_dbfs / 20) / rms
+        peak = float(np.max(np.abs(samples)))
+        if peak * gain > 1.0:
+            gain = 1.0 / peak
+        samples *= gain
+        return samples
+
+    def fade(self, samples):
+        """Linear fade in/out on the segment edges (a crossfade only where parts overlap)"""
+        n = min(int(self.sample_rate * self.crossfade_ms / 1000), len(samples) // 2)
+        if n > 0:
+            ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            samples[:n] *= ramp
+            samples[-n:] *= ramp[::-1]
+        return samples
+
+    def render(self, audio_file_paths, dialogue_gap_ms, lead_ms=0, normalize=True, remove_sources=True):
+        """
+        Stitch the parts into a single float32 buffer with dialogue_gap_ms of silence
+        after each one. With a gap of 0, neighbouring parts overlap by crossfade_ms
+        instead. Returns the buffer (range -1.0..1.0).
+        """
+        gap = int(self.sample_rate * dialogue_gap_ms / 1000)
+        lead = int(self.sample_rate * lead_ms / 1000)
+        overlap = int(self.sample_rate * self.crossfade_ms / 1000)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            raw_parts = []
+            for i, audio_path in enumerate(audio_file_paths):
+                raw_path = os.path.join(tmp_dir, f"part{i}.raw")
+                raw_parts.append((raw_path, self.decode_to_raw(audio_path, raw_path)))
+                if remove_sources:
+                    os.remove(audio_path)
+
+            # Work out every offset first so the output is allocated exactly once
+            offsets = []
+            cursor = lead
+            total = lead
+            for _, length in raw_parts:
+                offsets.append(cursor)
+                total = max(total, cursor + length + gap)
+                step = length + gap
+                # With no gap, adjacent parts overlap by the crossfade length
+                if gap == 0:
+                    step -= min(overlap, length // 2)
+                cursor += step
+
+            buffer = np.zeros(total, dtype=np.float32)
+            for (raw_path, length), offset in zip(raw_parts, offsets):
+                if length == 0:
+                    continue
+                segment = np.fromfile(raw_path, dtype=np.int16).astype(np.float32)
+                segment /= 32768.0
+                if normalize:
+                    self.normalize(segment)
+                self.fade(segment)
+                buffer[offset:offset + length] += segment
+                del segment
+
+        return buffer
+
+    def _encode_command(self, audio_format, output="pipe:1"):
+        return ["ffmpeg", "-v", "error", "-y", "-f", "s16le", "-ac", "1", "-ar", str(self.sample_rate),
+                "-i", "pipe:0", "-f", audio_format, output]
+
+    def _write_pcm(self, buffer, stream):
+        try:
+            for start in range(0, len(buffer), ENCODE_CHUNK_SAMPLES):
+                chunk = np.clip(buffer[start:start + ENCODE_CHUNK_SAMPLES], -1.0, 1.0)
+                stream.write((chunk * 32767).astype(np.int16).tobytes())
+        except BrokenPipeError:
+            # ffmpeg exited early (or was killed); its exit code reports the failure
+            pass
+        finally:
+            try:
+                stream.close()
+            except BrokenPipeError:
+                pass
+
+    def encode(self, buffer, file_path, audio_format="mp3"):
+        """Encode the buffer to a file in a single ffmpeg pass"""
+        process = subprocess.Popen(self._encode_command(audio_format, file_path), stdin=subprocess.PIPE)
+        self._write_pcm(buffer, process.stdin)
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg encode failed with exit code {process.returncode}")
+        return file_path
+
+    def encode_stream(self, buffer, consume, audio_format="mp3"):
+        """
+        Encode the buffer and hand ffmpeg's output stream to consume(fileobj), e.g.
+        a partial of s3.upload_fileobj, so the encoded file never touches disk.
+        """
+        process = subprocess.Popen(self._encode_command(audio_format), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        writer = threading.Thread(target=self._write_pcm, args=(buffer, process.stdin), daemon=True)
+        writer.start()
+        try:
+            result = consume(process.stdout)
+        except BaseException:
+            # Nothing reads ffmpeg's output any more, so stop it before waiting on the writer
+            process.stdout.close()
+            process.kill()
+            writer.join()
+            process.wait()
+            raise
+        writer.join()
+        process.stdout.close()
+        process.wait()
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg encode failed with exit code {process.returncode}")
+        return result
@@ -0,0 +1,194 @@
+"""
+Render many podcast episodes from a JSONL file of {"podcast_name", "dialogue"} jobs.
+
+    python batch_podcasts.py jobs.jsonl --workers 4 --polly-concurrency 8
+
+Finished jobs are checkpointed to <jobs>.progress.jsonl, so re-running the same
+command after a crash or restart skips episodes that already completed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import boto3
+import load_environment
+from generate_audio import Podcast
+from podcast_manifest import PodcastManifest
+
+# Polly calls that count against the global concurrency limit
+THROTTLED_CALLS = {"synthesize_speech", "start_speech_synthesis_task", "get_speech_synthesis_task"}
+
+# Shared limit on in-flight Polly requests, set per worker by init_worker
+_polly_semaphore = None
+
+
+class ThrottledPollyClient:
+    """Wraps a boto3 Polly client so speech calls share one global concurrency limit"""
+    def __init__(self, client, semaphore):
+        self.client = client
+        self.semaphore = semaphore
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name not in THROTTLED_CALLS:
+            return attr
+
+        def throttled(*args, **kwargs):
+            with self.semaphore:
+                return attr(*args, **kwargs)
+        return throttled
+
+
+def init_worker(semaphore):
+    global _polly_semaphore
+    _polly_semaphore = semaphore
+
+
+def run_job(job):
+    """Render one episode. Runs inside a pool worker and returns a progress record"""
+    started = time.monotonic()
+    record = {"job_id": job["job_id"], "podcast_name": job["podcast_name"]}
+    try:
+        env = load_environment.load_env()
+        # The default boto3 session isn't thread-safe; each job builds its clients from its own
+        session = boto3.session.Session()
+        polly_client = ThrottledPollyClient(
+            session.client('polly', endpoint_url=env.get('POLLY_ENDPOINT_URL')), _polly_semaphore)
+        s3_client = session.client('s3', endpoint_url=env.get('S3_ENDPOINT_URL'))
+        pod = Podcast(job["podcast_name"], polly_client=polly_client, s3_client=s3_client)
+
+        url, reused = PodcastManifest(s3_client=pod.s3).get_or_create(
+            job["job_id"], job["podcast_name"], lambda: pod.create_podcast(job["dialogue_json"]))
+        record.update({
+            "status": "done",
+            "url": url,
+            "reused": reused,
+            "polly_chars": 0 if reused else pod.polly_chars,
+            "audio_seconds": 0.0 if reused else pod.audio_seconds
+        })
+    except Exception as e:
+        record.update({"status": "failed", "error": str(e)})
+    record["elapsed"] = time.monotonic() - started
+    return record
+
+
+def load_jobs(jobs_path):
+    env = load_environment.load_env()
+    jobs = []
+    # podcast_name -> job_id; the name is the S3 key, so it must identify a single script
+    seen_names = {}
+    # job_id -> podcast_name; each script is rendered once, even across worker processes
+    seen_jobs = {}
+    with open(jobs_path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            if "podcast_name" not in job or "dialogue" not in job:
+                raise ValueError(f"{jobs_path}:{line_number}: job needs 'podcast_name' and 'dialogue'")
+            dialogue = job["dialogue"]
+            dialogue_json = dialogue if isinstance(dialogue, str) else json.dumps(dialogue)
+            # Same key as the chat tool uses, so batch and chat renders dedupe against each other
+            job_id = Podcast.script_key(dialogue_json, env)
+            podcast_name = job["podcast_name"]
+            if podcast_name in seen_names:
+                if seen_names[podcast_name] == job_id:
+                    print(f"{jobs_path}:{line_number}: skipping duplicate of '{podcast_name}'")
+                    continue
+                raise ValueError(f"{jobs_path}:{line_number}: podcast_name '{podcast_name}' is used by another job with a different script")
+            if job_id in seen_jobs:
+                print(f"{jobs_path}:{line_number}: skipping '{podcast_name}', same script as '{seen_jobs[job_id]}'")
+                continue
+            seen_names[podcast_name] = job_id
+            seen_jobs[job_id] = podcast_name
+            jobs.append({
+                "job_id": job_id,
+                "podcast_name": podcast_name,
+                "dialogue_json": dialogue_json
+            })
+    return jobs
+
+
+def load_completed(progress_path):
+    completed = set()
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write can leave a partial last line
+                    continue
+                if record.get("status") == "done":
+                    completed.add(record["job_id"])
+    return completed
+
+
+def print_summary(records, wall_seconds):
+    done = [r for r in records if r["status"] == "done"]
+    failed = [r for r in records if r["status"] == "failed"]
+    rendered = [r for r in done if not r["reused"]]
+    audio_seconds = sum(r["audio_seconds"] for r in rendered)
+    polly_chars = sum(r["polly_chars"] for r in rendered)
+    minutes = wall_seconds / 60 if wall_seconds else 0
+
+    print("=" * 60)
+    print(f"Episodes: {len(done)} done ({len(rendered)} rendered, {len(done) - len(rendered)} reused), {len(failed)} failed")
+    print(f"Wall time: {wall_seconds:.1f}s")
+    if minutes:
+        print(f"Throughput: {len(done) / minutes:.2f} episodes/min, "
+              f"{audio_seconds / minutes:.1f} audio seconds/min, "
+              f"{polly_chars / wall_seconds:.1f} Polly chars/sec")
+    for r in failed:
+        print(f"  ✗ {r['podcast_name']}: {r['error']}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-render podcast episodes from a JSONL job file")
+    parser.add_argument("jobs", help="JSONL file with one {\"podcast_name\", \"dialogue\"} object per line")
+    parser.add_argument("--workers", type=int, default=4, help="Episodes rendered in parallel")
+    parser.add_argument("--polly-concurrency", type=int, default=8, help="Max in-flight Polly requests across all workers")
+    parser.add_argument("--processes", action="store_true", help="Use a process pool instead of threads (parallel stitching)")
+    parser.add_argument("--progress", help="Checkpoint file (default: <jobs>.progress.jsonl)")
+    args = parser.parse_args()
+
+    progress_path = args.progress or f"{args.jobs}.progress.jsonl"
+    jobs = load_jobs(args.jobs)
+    completed = load_completed(progress_path)
+    pending = [job for job in jobs if job["job_id"] not in completed]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already completed, {len(pending)} to run")
+    if not pending:
+        return
+
+    if args.processes:
+        manager = multiprocessing.Manager()
+        semaphore = manager.BoundedSemaphore(args.polly_concurrency)
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(semaphore,))
+    else:
+        init_worker(threading.BoundedSemaphore(args.polly_concurrency))
+        pool = ThreadPoolExecutor(max_workers=args.workers)
+
+    records = []
+    started = time.monotonic()
+    with pool, open(progress_path, "a") as progress:
+        futures = [pool.submit(run_job, job) for job in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            # Checkpoint as each episode finishes so a restart resumes from here
+            progress.write(json.dumps(record) + "\n")
+            progress.flush()
+            mark = "✓" if record["status"] == "done" else "✗"
+            print(f"  {mark} [{len(records)}/{len(pending)}] {record['podcast_name']} ({record['elapsed']:.1f}s)")
+
+    print_summary(records, time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()
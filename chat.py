@@ -1,13 +1,21 @@
 import anthropic
 import json
 from generate_audio import Podcast
+from podcast_manifest import PodcastManifest
 
 class Chat:
-    def __init__(self, api_key, tools=True):
+    def __init__(self, api_key, tools=True, store=None, session_id=None):
         self.client = anthropic.Anthropic(api_key=api_key)
         self.conversation_history = []
         self.loaded_documents = []  # Track loaded docs
 
+        # Optional ConversationStore; when set, history is persisted and only a recent window is kept in memory
+        self.store = store
+        self.session_id = session_id
+        self.summary = None
+        if self.store:
+            self.restore()
+
         if tools:
             self.tools =  [ # descriptions were created by Claude
                 {
@@ -83,123 +91,134 @@ class Chat:
     def clear_chat(self):
         self.conversation_history = []
         self.loaded_documents = []
+        self.summary = None
+        if self.store:
+            self.store.clear(self.session_id)
+
+
+    def restore(self):
+        """Load the recent window of this session (plus a summary of older turns) from the store"""
+        self.summary, self.conversation_history = self.store.load_recent(self.session_id)
+
+
+    def system_prompt(self):
+        if self.summary:
+            return {"system": f"Summary of the earlier conversation, which is no longer shown in full:\n{self.summary}"}
+        return {}
 
 
-    def chat_stream(self, message):
+    def chat_stream(self, message, display_message=None):
         """Stream chat responses - returns a generator for streaming text"""
+        if not self.store:
+            yield from self._chat_stream(message)
+            return
+
+        # Attached document bodies are re-sent with every message, so the stored api row
+        # keeps only the prompt; that keeps them out of the restored window and its budget
+        stored_message = display_message or message
+
+        self.store.append(self.session_id, "user", stored_message, kind="display")
+        shown = ""
+        try:
+            for text in self._chat_stream(message, stored_message):
+                shown += text
+                yield text
+        finally:
+            self.store.append(self.session_id, "assistant", shown, kind="display")
+            # Drop everything but the recent window from memory; the full history is on disk
+            self.restore()
+
+
+    def _chat_stream(self, message, stored_message=None):
         '''Vibe Code.  Used function manually created chat() as template'''
-        self.add_message("user", message)
+        self.add_message("user", message, stored_message=stored_message)
         
         try:
             with self.client.messages.stream(
                 model="claude-sonnet-4-5-20250929",
                 max_tokens=5012,
                 tools=self.tools,
-                messages=self.conversation_history
+                messages=self.conversation_history,
+                **self.system_prompt()
             ) as stream:
                 # Yield text chunks as they come
                 for text in stream.text_stream:
                     yield text
                 
                 # After streaming, handle tool calls
-                final_message = stream.get_final_message()
-                self.add_message("assistant", final_message.content)
-                
-                # Process tools if needed
-                if final_message.stop_reason == "tool_use":
-                    for block in final_message.content:
-                        if block.type == "tool_use":
-                            yield f"\n\n🔧 Using tool: {block.name}...\n\n"
-                            
-                            result = self.process_tool_call(block.name, block.input)
-                            
-                            self.add_message("user", [{
-                                "type": "tool_result",
-                                "tool_use_id": block.id,
-                                "content": json.dumps(result)
-                            }])
-                            
-                            # Get follow-up response
-                            follow_up = self.client.messages.create(
-                                model="claude-sonnet-4-5-20250929",
-                                max_tokens=5012,
-                                tools=self.tools,
-                                messages=self.conversation_history
-                            )
-                            
-                            self.add_message("assistant", follow_up.content)
-                            
-                            for follow_block in follow_up.content:
-                                if hasattr(follow_block, "text"):
-                                    yield follow_block.text
-                                    
-        except Exception as e:
-            yield f"\n\nError: {e}"
-
-
-    def chat(self, message):
-        # Legacy
-        self.add_message("user", message)
-        
-        try:
-            response = self.client.messages.create(
-                model="claude-sonnet-4-5-20250929",
-                max_tokens=5012,
-                tools=self.tools,
-                messages=self.conversation_history
-            )
+                response = stream.get_final_message()
+            self.add_message("assistant", response.content, response.usage.output_tokens)
             
+            # Keep answering tool calls until Claude stops asking for them
             while response.stop_reason == "tool_use":
-                self.add_message("assistant", response.content)
-                
                 tool_results = []
                 for block in response.content:
-                    if block.type == "text":
-                        print(f"\nClaude: {block.text}")
-                    elif block.type == "tool_use":
-                        tool_name = block.name
-                        tool_input = block.input
-                        
-                        print(f"Calling tool: {tool_name}")
-                        
-                        result = self.process_tool_call(tool_name, tool_input)
-                        
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": json.dumps(result)
-                        })
+                    if block.type == "tool_use":
+                        yield f"\n\n🔧 Using tool: {block.name}...\n\n"
+                        tool_results.append(self.run_tool(block))
                 
-                if tool_results:
-                    self.add_message("user", tool_results)
+                # Every tool_use gets its tool_result, even on failure, so the stored history stays valid
+                self.add_message("user", tool_results)
                 
+                # Get follow-up response
                 response = self.client.messages.create(
                     model="claude-sonnet-4-5-20250929",
                     max_tokens=5012,
                     tools=self.tools,
-                    messages=self.conversation_history
+                    messages=self.conversation_history,
+                    **self.system_prompt()
                 )
-            
-            self.add_message("assistant", response.content)
-            for block in response.content:
-                if hasattr(block, "text"):
-                    print(f"\nClaude: {block.text}\n")
-            
+                
+                self.add_message("assistant", response.content, response.usage.output_tokens)
+                
+                for follow_block in response.content:
+                    if hasattr(follow_block, "text"):
+                        yield follow_block.text
+                                    
         except Exception as e:
-            print(f"\nError: {e}\n")
-            if self.conversation_history and self.conversation_history[-1]["role"] == "user":
-                self.conversation_history.pop()
+            yield f"\n\nError: {e}"
+
 
+    def chat(self, message):
+        # Legacy console entry point; shares chat_stream's tool loop and store handling
+        print("\nClaude: ", end="")
+        for text in self.chat_stream(message):
+            print(text, end="", flush=True)
+        print("\n")
 
-    def add_message(self, role, message):
+
+    def add_message(self, role, message, tokens=None, stored_message=None):
         self.conversation_history.append({'role': role, "content": message})
+        if self.store:
+            self.store.append(self.session_id, role, message if stored_message is None else stored_message, tokens)
+
+
+    def run_tool(self, block):
+        """Run a tool_use block and build its tool_result, reporting failures as an error result"""
+        try:
+            result = self.process_tool_call(block.name, block.input)
+            return {"type": "tool_result", "tool_use_id": block.id, "content": json.dumps(result)}
+        except Exception as e:
+            return {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": json.dumps({"error": f"Tool '{block.name}' failed: {e}"}),
+                "is_error": True
+            }
 
 
     def process_tool_call(self, tool_name, tool_input):
         if tool_name == "generate_podcast_audio":
-            pod = Podcast(tool_input['podcast_name'])
-            url = pod.create_podcast(tool_input['dialogue_json'])
-            return {"success": True, "url": url, "message": f"Podcast '{tool_input['podcast_name']}' created successfully!"}
+            podcast_name = tool_input['podcast_name']
+            dialogue_json = tool_input['dialogue_json']
+
+            # Retried tool calls / repeat requests for the same script reuse the finished upload
+            key = Podcast.script_key(dialogue_json)
+            url, reused = PodcastManifest().get_or_create(
+                key, podcast_name, lambda: Podcast(podcast_name).create_podcast(dialogue_json))
+            if reused:
+                return {"success": True, "url": url, "message": f"Podcast '{podcast_name}' already exists, reusing the existing episode."}
+            return {"success": True, "url": url, "message": f"Podcast '{podcast_name}' created successfully!"}
             
         else:
             return {"error": f"Unknown tool '{tool_name}'"}
@@ -0,0 +1,235 @@
+import json
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timezone
+
+# Payloads above this many bytes (mostly tool inputs/results) are zlib compressed
+COMPRESS_THRESHOLD = 2048
+# Token budget for the window of history restored into memory
+DEFAULT_WINDOW_TOKENS = 20000
+# Rolling summary: each message that leaves the window adds one line of at most
+# SUMMARY_SNIPPET_CHARS; the oldest lines are dropped past SUMMARY_MAX_CHARS
+SUMMARY_SNIPPET_CHARS = 300
+SUMMARY_MAX_CHARS = 8000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    summary TEXT,
+    summarized_through INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content BLOB NOT NULL,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, kind, id);
+"""
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token) used when the API gives no usage"""
+    return max(1, len(text) // 4)
+
+
+def _to_jsonable(block):
+    # Anthropic SDK content blocks are pydantic models
+    if hasattr(block, "model_dump"):
+        return block.model_dump(exclude_none=True)
+    raise TypeError(f"Cannot serialize {type(block).__name__}")
+
+
+def _summary_line(role, content):
+    """One summary line for an api message, or None if it carries no text"""
+    if isinstance(content, str):
+        text = content
+    else:
+        parts = []
+        for block in content:
+            if block.get("type") == "text":
+                parts.append(block["text"])
+            elif block.get("type") == "tool_use":
+                parts.append(f"[called {block['name']}]")
+            elif block.get("type") == "tool_result":
+                result = block.get("content")
+                parts.append(f"[tool result: {result if isinstance(result, str) else json.dumps(result)}]")
+        text = " ".join(parts)
+    text = " ".join(text.split())
+    if not text:
+        return None
+    if len(text) > SUMMARY_SNIPPET_CHARS:
+        text = text[:SUMMARY_SNIPPET_CHARS] + "..."
+    return f"{'User' if role == 'user' else 'Assistant'}: {text}"
+
+
+def _is_turn_start(message):
+    """A restored window must start on a plain user message, never on a tool_result"""
+    if message["role"] != "user":
+        return False
+    content = message["content"]
+    if isinstance(content, str):
+        return True
+    return not any(isinstance(block, dict) and block.get("type") == "tool_result" for block in content)
+
+
+class ConversationStore:
+    """
+    SQLite (WAL) backed store for Chat sessions. Messages are appended as they
+    happen, and restoring a session only loads the most recent window plus a
+    summary of what came before, so idle sessions cost almost nothing in RAM.
+
+    Two kinds of rows are kept per session: "api" rows are the exact messages sent
+    to Claude, "display" rows are the text shown in the UI.
+    """
+    def __init__(self, db_path="chat_sessions.db"):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Databases created before the rolling summary lack its high-water mark
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(sessions)")]
+        if "summarized_through" not in columns:
+            self.conn.execute("ALTER TABLE sessions ADD COLUMN summarized_through INTEGER NOT NULL DEFAULT 0")
+        self.conn.commit()
+
+    def _encode(self, content):
+        payload = json.dumps(content, default=_to_jsonable).encode("utf-8")
+        if len(payload) > COMPRESS_THRESHOLD:
+            return zlib.compress(payload), 1, payload
+        return payload, 0, payload
+
+    def _decode(self, content, compressed):
+        if compressed:
+            content = zlib.decompress(content)
+        return json.loads(content)
+
+    def _touch(self, session_id, now):
+        self.conn.execute(
+            "INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at",
+            (session_id, now, now)
+        )
+
+    def append(self, session_id, role, content, tokens=None, kind="api"):
+        """Append one message to a session. Returns the token count recorded for it"""
+        blob, compressed, payload = self._encode(content)
+        if tokens is None:
+            tokens = estimate_tokens(payload.decode("utf-8"))
+        now = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            self._touch(session_id, now)
+            self.conn.execute(
+                "INSERT INTO messages (session_id, kind, role, content, compressed, tokens, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, kind, role, blob, compressed, tokens, now)
+            )
+            self.conn.commit()
+        return tokens
+
+    def load_recent(self, session_id, max_tokens=DEFAULT_WINDOW_TOKENS):
+        """
+        Return (summary, messages) where messages is the newest run of api messages
+        fitting in max_tokens, starting on a user turn. The most recent turn is always
+        kept whole, even when it alone exceeds max_tokens. summary describes anything older.
+        """
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT id, role, content, compressed, tokens FROM messages "
+                "WHERE session_id = ? AND kind = 'api' ORDER BY id DESC",
+                (session_id,)
+            )
+            window = []
+            # Length of window when it last reached back to the start of a turn
+            turn_start = 0
+            used = 0
+            # Rows are streamed newest first so only the window is ever decoded
+            for row_id, role, content, compressed, tokens in cursor:
+                if turn_start and used + tokens > max_tokens:
+                    break
+                message = {"id": row_id, "role": role, "content": self._decode(content, compressed)}
+                window.append(message)
+                used += tokens
+                if _is_turn_start(message):
+                    turn_start = len(window)
+            cursor.close()
+            stored = self.conn.execute(
+                "SELECT summary, summarized_through FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+
+        window = window[:turn_start]
+        window.reverse()
+
+        summary, summarized_through = stored if stored else (None, 0)
+        first_id = window[0]["id"] if window else None
+        summary = self._roll_summary(session_id, summary, summarized_through, first_id)
+
+        return summary, [{"role": m["role"], "content": m["content"]} for m in window]
+
+    def _roll_summary(self, session_id, summary, summarized_through, first_id):
+        """
+        Fold api messages that have left the window (everything before first_id not yet
+        summarized) into the session's rolling summary, and persist it
+        """
+        query = ("SELECT id, role, content, compressed FROM messages "
+                 "WHERE session_id = ? AND kind = 'api' AND id > ?")
+        params = [session_id, summarized_through]
+        if first_id is not None:
+            query += " AND id < ?"
+            params.append(first_id)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY id", params).fetchall()
+        if not rows:
+            return summary
+
+        lines = summary.split("\n") if summary else []
+        for _, role, content, compressed in rows:
+            line = _summary_line(role, self._decode(content, compressed))
+            if line:
+                lines.append(line)
+        while len(lines) > 1 and sum(len(line) + 1 for line in lines) > SUMMARY_MAX_CHARS:
+            lines.pop(0)
+
+        summary = "\n".join(lines) or None
+        self.set_summary(session_id, summary, rows[-1][0])
+        return summary
+
+    def set_summary(self, session_id, summary, summarized_through):
+        """Persist the rolling summary covering api messages up to summarized_through"""
+        now = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            self._touch(session_id, now)
+            self.conn.execute(
+                "UPDATE sessions SET summary = ?, summarized_through = ? WHERE id = ?",
+                (summary, summarized_through, session_id)
+            )
+            self.conn.commit()
+
+    def display_messages(self, session_id, limit=50):
+        """Most recent UI transcript entries, oldest first"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT role, content, compressed FROM messages "
+                "WHERE session_id = ? AND kind = 'display' ORDER BY id DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        return [{"role": role, "content": self._decode(content, compressed)} for role, content, compressed in reversed(rows)]
+
+    def clear(self, session_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,19 +1,30 @@
 import streamlit as st
 from pathlib import Path
 import time
+import uuid
 from object_storage import ObjectStorage
 from chat import Chat
+from conversation_store import ConversationStore
 import load_environment
 '''Frontend was fully claude'''
 env = load_environment.load_env()
 object_storage = ObjectStorage()
 
+@st.cache_resource
+def get_conversation_store():
+    """One SQLite-backed store shared by every session in this server process"""
+    return ConversationStore(env.get("CHAT_DB_PATH") or "chat_sessions.db")
+
+conversation_store = get_conversation_store()
+
 # Page configuration
 st.set_page_config(page_title="Multi-Function App", layout="wide")
 
 # Initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# The session id lives in the URL so a restarted server can restore the conversation
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
 
 if "uploaded_files" not in st.session_state:
     st.session_state.uploaded_files = []
@@ -33,19 +44,9 @@ if "selected_files" not in st.session_state:
 if "document_mode" not in st.session_state:
     st.session_state.document_mode = True
 
-# Helper function to read document from S3
-def read_document_from_s3(bucket, key):
-    """Read document content from S3 using object_storage"""
-    try:
-        content = object_storage.read_file(bucket, key)
-        
-        # Handle different file types
-        if key.endswith('.txt'):
-            return content.decode('utf-8')
-        else:
-            return content.decode('utf-8', errors='ignore')
-    except Exception as e:
-        return f"Error reading file: {str(e)}"
+# Result of the last file action; kept in session state so it survives st.rerun()
+if "file_action_result" not in st.session_state:
+    st.session_state.file_action_result = None
 
 def toggle_file_selection(file_info):
     """Toggle file in/out of selected files"""
@@ -72,17 +73,30 @@ def build_message_with_docs(user_message):
     if not st.session_state.document_mode or not st.session_state.selected_files:
         return user_message
     
-    # Build message with documents
-    docs_text = ""
-    for file_info in st.session_state.selected_files:
-        content = read_document_from_s3(file_info['bucket'], file_info['path'])
-        docs_text += f'\n\n<document name="{file_info["name"]}">\n{content}\n</document>'
+    # Build message with documents, keeping the total under the per-request cap
+    selected = st.session_state.selected_files
+    contents = object_storage.read_texts(
+        [(file_info['bucket'], file_info['path']) for file_info in selected],
+        max_bytes=object_storage.per_doc_bytes(len(selected))
+    )
+
+    parts = [user_message]
+    for file_info in selected:
+        result = contents.get(file_info['path'])
+        if isinstance(result, Exception):
+            content = f"Error reading file: {str(result)}"
+        else:
+            content, _ = result
+        parts.append(f'\n\n<document name="{file_info["name"]}">\n{content}\n</document>')
     
-    return f"{user_message}{docs_text}"
+    return "".join(parts)
 
 # Main title
 st.title("Multi-Function Dashboard")
 
+# List every storage folder in one pass; the columns below read from it
+storage_folders = object_storage.get_objects_by_folder()
+
 # Create three columns
 col1, col2, col3 = st.columns(3)
 
@@ -128,11 +142,40 @@ with col1:
     # Display all uploaded files from cloud storage
     st.subheader("Your Files")
     
+    # Show the outcome of the delete that triggered this rerun
+    if st.session_state.file_action_result:
+        level, message = st.session_state.file_action_result
+        if level == "error":
+            st.error(message)
+        else:
+            st.success(message)
+        st.session_state.file_action_result = None
+    
     # Show selected files count
     if st.session_state.selected_files:
         st.info(f"📌 {len(st.session_state.selected_files)} file(s) selected")
+        
+        # Delete every selected file in one batched request
+        if st.button("🗑️ Delete Selected", use_container_width=True):
+            results = object_storage.delete_objects(
+                [f"files/{f['name']}" for f in st.session_state.selected_files]
+            )
+            failed = [path for path, result in results.items() if not result['success']]
+            st.session_state.selected_files = [
+                f for f in st.session_state.selected_files
+                if f"files/{f['name']}" in failed
+            ]
+            if failed:
+                errors = [f"{path} ({results[path]['error']})" for path in failed]
+                st.session_state.file_action_result = (
+                    "error",
+                    f"Deleted {len(results) - len(failed)} file(s). Could not delete: {', '.join(errors)}"
+                )
+            else:
+                st.session_state.file_action_result = ("success", f"Deleted {len(results)} file(s)!")
+            st.rerun()
     
-    files = object_storage.get_objects("files")
+    files = storage_folders.get("files", [])
     
     if files:
         # Create scrollable container for files
@@ -195,7 +238,9 @@ with col1:
                                 rel_path = f"files/{file_info['name']}"
                                 success = object_storage.document_delete(rel_path)
                                 if success:
-                                    st.success("File deleted!")
+                                    st.session_state.file_action_result = ("success", f"{file_info['name']} deleted!")
+                                else:
+                                    st.session_state.file_action_result = ("error", f"Could not delete {file_info['name']}")
                                 st.rerun()
                     
                     st.divider()
@@ -221,7 +266,12 @@ with col2:
     # Initialize chat instance when API key is provided
     if api_key_input and api_key_input != st.session_state.api_key:
         st.session_state.api_key = api_key_input
-        st.session_state.chat_instance = Chat(api_key=api_key_input, tools=True)
+        st.session_state.chat_instance = Chat(
+            api_key=api_key_input,
+            tools=True,
+            store=conversation_store,
+            session_id=st.session_state.session_id
+        )
         st.success("✓ Chat initialized!")
     
     # Document mode toggle
@@ -240,10 +290,10 @@ with col2:
         else:
             st.caption("📄 Document mode off")
     
-    # Display chat messages
+    # Display chat messages (read from the conversation store, not kept in session state)
     chat_container = st.container(height=330)
     with chat_container:
-        for message in st.session_state.messages:
+        for message in conversation_store.display_messages(st.session_state.session_id):
             with st.chat_message(message["role"]):
                 st.write(message["content"])
     
@@ -255,9 +305,6 @@ with col2:
             # Build message with documents if mode is on
             full_prompt = build_message_with_docs(prompt)
             
-            # Add user message to session state (show only the prompt, not docs)
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            
             # Display user message
             with chat_container:
                 with st.chat_message("user"):
@@ -270,20 +317,14 @@ with col2:
                         message_placeholder = st.empty()
                         full_response = ""
                         
-                        # Stream response from chat.py (with documents attached)
-                        for text_chunk in st.session_state.chat_instance.chat_stream(full_prompt):
+                        # Stream response from chat.py (with documents attached, transcript shows only the prompt)
+                        for text_chunk in st.session_state.chat_instance.chat_stream(full_prompt, display_message=prompt):
                             full_response += text_chunk
                             message_placeholder.write(full_response + "▌")
                         
                         # Remove cursor
                         message_placeholder.write(full_response)
                 
-                # Store assistant response in UI messages
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": full_response
-                })
-                
             except Exception as e:
                 st.error(f"Error: {str(e)}")
     
@@ -291,9 +332,10 @@ with col2:
     
     # Clear chat button
     if st.button("Clear Chat", use_container_width=True):
-        st.session_state.messages = []
         if st.session_state.chat_instance:
             st.session_state.chat_instance.clear_chat()
+        else:
+            conversation_store.clear(st.session_state.session_id)
         st.rerun()
 
 # Column 3: MP3 Player
@@ -301,7 +343,7 @@ with col3:
     st.header("🎵 MP3 Player")
     
     # Get audio files from S3
-    audio_files = object_storage.get_objects("podcasts")
+    audio_files = storage_folders.get("podcasts", [])
     
     if audio_files:
         # Create a selectbox to choose audio file
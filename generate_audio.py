@@ -3,20 +3,172 @@ from pydub import AudioSegment
 import os
 import load_environment
 import json
-import urllib
+import re
+import shutil
+import tempfile
+import time
+import urllib.parse
+from xml.sax.saxutils import escape
+from podcast_manifest import script_hash
 
+# Speaker -> Polly voice used for each side of the conversation
+VOICE_MAP = {
+    "host": "Ruth",
+    "guest": "Patrick",
+    #"guest": "Stephen",
+}
+
+# Polly's synchronous synthesize_speech caps billed characters per request
+POLLY_MAX_CHARS = 3000
+# Default gap between stitched clips (scaled by 100 to milliseconds)
+STITCH_GAP = 1.5
+# Stitching engine used unless AUDIO_ENGINE is set ("pydub" or "numpy")
+DEFAULT_AUDIO_ENGINE = "pydub"
+# Asynchronous synthesis tasks accept far larger inputs than synthesize_speech
+POLLY_TASK_MAX_CHARS = 100000
+# Scripts longer than this (in characters) are rendered with synthesis tasks
+ASYNC_SCRIPT_CHARS = 20000
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+def ssml_len(text):
+    """Length of text once escaped for an SSML document"""
+    return len(escape(text))
+
+
+def split_sentences(text, max_chars=POLLY_MAX_CHARS, measure=len):
+    """
+    Split text into chunks no longer than max_chars, breaking at sentence
+    boundaries where possible and falling back to word boundaries.
+    measure gives a chunk's length as it will be sent (e.g. ssml_len), so cuts
+    are made in the raw text and never split an escape sequence.
+    """
+    def fit(sentence):
+        # Longest prefix of sentence that measures within max_chars
+        lo, hi = 1, min(len(sentence), max_chars)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if measure(sentence[:mid]) <= max_chars:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    chunks = []
+    current = ""
+    current_len = 0
+    for sentence in SENTENCE_BOUNDARY.split(text.strip()):
+        while measure(sentence) > max_chars:
+            limit = fit(sentence)
+            cut = sentence.rfind(" ", 0, limit)
+            if cut <= 0:
+                cut = limit
+            if current:
+                chunks.append(current)
+                current = ""
+                current_len = 0
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if not sentence:
+            continue
+        length = measure(sentence)
+        if current and current_len + 1 + length > max_chars:
+            chunks.append(current)
+            current, current_len = sentence, length
+        elif current:
+            current = f"{current} {sentence}"
+            current_len += 1 + length
+        else:
+            current, current_len = sentence, length
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def plan_segments(dialogue, pause_ms, voice_map=VOICE_MAP, max_chars=POLLY_MAX_CHARS):
+    """
+    Coalesce consecutive same-speaker dialogue into as few Polly requests as possible.
+
+    Lines within one speaker's turn are joined with an SSML <break> of pause_ms so the
+    audio keeps the same pauses it would have had when stitched from separate clips.
+    A line too long for one request is split at sentence boundaries and continues
+    without a pause. Returns a list of {"voice_id", "text"} dicts where text is an
+    SSML document.
+    """
+    brk = f'<break time="{int(pause_ms)}ms"/>'
+    # Room for the <speak></speak> wrapper around every request
+    budget = max_chars - len("<speak></speak>")
+
+    segments = []
+    current_voice = None
+    current_parts = []
+    current_len = 0
+
+    def flush():
+        if current_parts:
+            segments.append({
+                "voice_id": current_voice,
+                "text": f"<speak>{brk.join(current_parts)}</speak>"
+            })
+
+    for dialogue_clip in dialogue:
+        voice_id = voice_map.get(dialogue_clip['speaker'])
+        if voice_id is None:
+            raise(Exception("An unknown speaker was present in the dialogue"))
+
+        # Split the raw text so a cut never lands inside an escape like &amp;
+        chunks = split_sentences(dialogue_clip['text'], budget, measure=ssml_len)
+        for i, chunk in enumerate(chunks):
+            part = escape(chunk)
+            # Only a new line gets the pause; later chunks of the same line follow a space
+            separator = " " if i else brk
+            added = len(part) + (len(separator) if current_parts else 0)
+            if voice_id != current_voice or current_len + added > budget:
+                flush()
+                current_voice = voice_id
+                current_parts = [part]
+                current_len = len(part)
+            elif i:
+                current_parts[-1] += separator + part
+                current_len += added
+            else:
+                current_parts.append(part)
+                current_len += added
+
+    flush()
+    return segments
+
+
+def audio_engine_from_env(env):
+    """Stitching engine selected by AUDIO_ENGINE ("pydub" or "numpy")"""
+    return env.get('AUDIO_ENGINE') or DEFAULT_AUDIO_ENGINE
+
+
+def s3_key_from_uri(uri, bucket_name):
+    """Object key from an S3 https URL in either virtual-hosted or path style"""
+    parsed = urllib.parse.urlparse(uri)
+    path = urllib.parse.unquote(parsed.path).lstrip('/')
+    if not parsed.netloc.startswith(f"{bucket_name}.") and path.startswith(f"{bucket_name}/"):
+        path = path[len(bucket_name) + 1:]
+    return path
+
+
+class SynthesisTaskError(Exception):
+    """A Polly synthesis task failed or timed out"""
 
 
 class Polly:
-    def __init__(self):
-        self.client = boto3.client('polly')
+    def __init__(self, client=None):
+        # boto3's default session isn't thread-safe, so clients come from a session of our own
+        self.client = client or boto3.session.Session().client('polly')
         self.voices = self.list_available_voices()
     
-    def synthesize_speech(self, dialogue, voice_id):
+    def synthesize_speech(self, dialogue, voice_id, text_type="text"):
         try:
             # Call Polly to synthesize speech
             response = self.client.synthesize_speech(
                 Text=dialogue,
+                TextType=text_type,
                 OutputFormat="mp3",
                 VoiceId=voice_id,
                 Engine='long-form'  
@@ -32,6 +184,85 @@ class Polly:
             print(f"  ✗ Polly error: {str(e)}")
             raise
 
+    def start_synthesis_task(self, dialogue, voice_id, bucket_name, key_prefix, text_type="text"):
+        """
+        Start an asynchronous Polly synthesis task that writes its MP3 straight to S3
+        under key_prefix. Returns the task id; wait_for_tasks reports the output URI.
+        """
+        try:
+            response = self.client.start_speech_synthesis_task(
+                Text=dialogue,
+                TextType=text_type,
+                OutputFormat="mp3",
+                VoiceId=voice_id,
+                Engine='long-form',
+                OutputS3BucketName=bucket_name,
+                OutputS3KeyPrefix=key_prefix
+            )
+            return response['SynthesisTask']['TaskId']
+
+        except Exception as e:
+            print(f"  ✗ Polly task error: {str(e)}")
+            raise
+
+    def wait_for_tasks(self, task_ids, initial_delay=1.0, max_delay=30.0, timeout=1800):
+        """
+        Poll synthesis tasks until all of them complete, backing off exponentially
+        between rounds. Returns {task_id: OutputUri}. Raises SynthesisTaskError if any
+        task fails or the timeout is reached.
+        """
+        pending = set(task_ids)
+        completed = {}
+        delay = initial_delay
+        deadline = time.monotonic() + timeout
+
+        while pending:
+            for task_id in list(pending):
+                task = self.client.get_speech_synthesis_task(TaskId=task_id)['SynthesisTask']
+                status = task['TaskStatus']
+                if status == 'completed':
+                    pending.discard(task_id)
+                    completed[task_id] = task['OutputUri']
+                elif status == 'failed':
+                    raise SynthesisTaskError(
+                        f"Polly task {task_id} failed: {task.get('TaskStatusReason', 'unknown reason')}")
+
+            if not pending:
+                break
+            if time.monotonic() + delay > deadline:
+                raise SynthesisTaskError(f"{len(pending)} Polly task(s) still running after {timeout}s")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+        return completed
+
+    def settle_tasks(self, task_ids, initial_delay=1.0, max_delay=30.0, timeout=600):
+        """
+        Best-effort wait for tasks to stop running (completed or failed) so their
+        output can be cleaned up after an error. Never raises.
+        """
+        pending = set(task_ids)
+        delay = initial_delay
+        deadline = time.monotonic() + timeout
+
+        while pending:
+            for task_id in list(pending):
+                try:
+                    status = self.client.get_speech_synthesis_task(TaskId=task_id)['SynthesisTask']['TaskStatus']
+                except Exception as e:
+                    print(f"  ✗ Polly task {task_id} status unavailable: {str(e)}")
+                    continue
+                if status in ('completed', 'failed'):
+                    pending.discard(task_id)
+
+            if not pending or time.monotonic() + delay > deadline:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+        if pending:
+            print(f"  ✗ {len(pending)} Polly task(s) still running; their output may be left behind")
+
     def list_available_voices(self):
         """
         Get list of available Polly voices.
@@ -51,41 +282,121 @@ class Polly:
         return voices
 
 class Podcast(Polly):
-    def __init__(self, podcast_name):
-        super().__init__()
+    def __init__(self, podcast_name, polly_client=None, s3_client=None):
         self.env = load_environment.load_env()
+        # Endpoint overrides let the pipeline run against a local stand-in (e.g. moto/localstack)
+        session = boto3.session.Session()
+        super().__init__(polly_client or session.client('polly', endpoint_url=self.env.get('POLLY_ENDPOINT_URL')))
+        self.s3 = s3_client or session.client('s3', endpoint_url=self.env.get('S3_ENDPOINT_URL'))
         self.bucket_name = self.env['S3_BUCKET_NAME']
         self.s3_parent_path = self.env['S3_PARENT_FOLDER']
         self.podcast_name = podcast_name
+        self.async_script_chars = int(self.env.get('POLLY_ASYNC_SCRIPT_CHARS') or ASYNC_SCRIPT_CHARS)
+        # "numpy" re-encodes through audio_engine.PcmEngine (normalized, single buffer)
+        self.audio_engine = audio_engine_from_env(self.env)
+        # Stats from the last create_podcast call (used for batch throughput reporting)
+        self.polly_chars = 0
+        self.audio_seconds = 0.0
+        # Scratch directory for the render in progress (unique per create_podcast call)
+        self.work_dir = None
+
+    @staticmethod
+    def script_key(dialogue_json, env=None):
+        """
+        Manifest key for a script: the hash of everything that shapes the finished
+        episode. The chat tool and batch jobs both use it, so they dedupe against each other.
+        """
+        if env is None:
+            env = load_environment.load_env()
+        return script_hash(dialogue_json, VOICE_MAP, STITCH_GAP, "mp3", audio_engine_from_env(env))
     
     def create_podcast(self, dialogue, dialogue_gap=.7):
         dialogue = json.loads(dialogue)
 
-        snippet_file_paths = []
-        for i, dialogue_clip in enumerate(dialogue):
-            if dialogue_clip['speaker'] == "host":
-                voice_id = 'Ruth'
-            elif dialogue_clip['speaker'] == "guest":
-                voice_id = 'Patrick'
-                #voice_id = 'Stephen'
+        # Long scripts go through asynchronous synthesis tasks instead of synthesize_speech
+        script_chars = sum(len(dialogue_clip['text']) for dialogue_clip in dialogue)
+        use_tasks = script_chars > self.async_script_chars
+        max_chars = POLLY_TASK_MAX_CHARS if use_tasks else POLLY_MAX_CHARS
+
+        # Pauses inside a merged turn match the silence stitch_audio puts between clips
+        segments = plan_segments(dialogue, STITCH_GAP * 100.00, max_chars=max_chars)
+        print(f"Synthesizing {len(dialogue)} dialogue lines in {len(segments)} Polly "
+              f"{'tasks' if use_tasks else 'requests'}")
+        # Polly bills the spoken text, not the SSML markup around it
+        self.polly_chars = script_chars
+
+        # Concurrent renders (even of the same podcast name) each get their own scratch files
+        self.work_dir = tempfile.mkdtemp(prefix="podcast-")
+        try:
+            if use_tasks:
+                snippet_file_paths = self.synthesize_segments_async(segments)
             else:
-                raise(Exception("An unknown speaker was present in the dialogue"))
-            response_stream  = self.synthesize_speech(dialogue_clip['text'], voice_id)
-            file_path = f"/tmp/{self.podcast_name}-part{i}.mp3"
+                snippet_file_paths = self.synthesize_segments(segments)
+
+            if self.audio_engine == "numpy":
+                return self.stitch_and_upload(snippet_file_paths, f"{self.s3_parent_path}/podcasts", self.podcast_name)
+
+            final_audio = self.stitch_audio(snippet_file_paths)
+            self.audio_seconds = final_audio.duration_seconds
+            final_audio_file_path = os.path.join(self.work_dir, "podcast.mp3")
+            final_audio.export(final_audio_file_path, format="mp3")
+            url = self.upload_to_s3(final_audio_file_path, self.bucket_name, f"{self.s3_parent_path}/podcasts", self.podcast_name)
+            return url
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+
+    def synthesize_segments(self, segments):
+        snippet_file_paths = []
+        for i, segment in enumerate(segments):
+            response_stream  = self.synthesize_speech(segment['text'], segment['voice_id'], text_type="ssml")
+            file_path = os.path.join(self.work_dir, f"part{i}.mp3")
             snippet_file_paths.append(file_path)
             with open(file_path, "wb") as f:
                 f.write(response_stream.read())
+        return snippet_file_paths
 
-        
+    def synthesize_segments_async(self, segments):
+        """
+        Render segments with Polly synthesis tasks. Polly writes each part to the
+        bucket itself; the parts are pulled down for stitching and then removed.
+        """
+        key_prefix = f"{self.s3_parent_path}/podcast-parts/{self.podcast_name}/{os.path.basename(self.work_dir)}/"
 
-        final_audio = self.stitch_audio(snippet_file_paths)
-        final_audio_file_path = f"/tmp/{self.podcast_name}"
-        final_audio.export(final_audio_file_path, format="mp3")
-        url = self.upload_to_s3(final_audio_file_path, self.bucket_name, f"{self.s3_parent_path}/podcasts", self.podcast_name)
-        return url
+        task_ids = []
+        try:
+            for segment in segments:
+                task_ids.append(self.start_synthesis_task(
+                    segment['text'], segment['voice_id'], self.bucket_name, key_prefix, text_type="ssml"))
+            outputs = self.wait_for_tasks(task_ids)
 
+            # Polly names the output objects itself, so the keys come from each task's OutputUri
+            snippet_file_paths = []
+            for i, task_id in enumerate(task_ids):
+                file_path = os.path.join(self.work_dir, f"part{i}.mp3")
+                self.s3.download_file(self.bucket_name, s3_key_from_uri(outputs[task_id], self.bucket_name), file_path)
+                snippet_file_paths.append(file_path)
+            return snippet_file_paths
+        except Exception:
+            # Tasks still running would write their parts after the cleanup below
+            self.settle_tasks(task_ids)
+            raise
+        finally:
+            # The prefix is unique to this render, so everything under it is ours to remove
+            self.delete_prefix(key_prefix)
+
+    def delete_prefix(self, key_prefix):
+        try:
+            paginator = self.s3.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=key_prefix):
+                keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+                if keys:
+                    self.s3.delete_objects(Bucket=self.bucket_name, Delete={'Objects': keys, 'Quiet': True})
+        except Exception as e:
+            print(f"Failed to clean up {key_prefix}: {e}")
 
-    def stitch_audio(self, audio_file_paths, dialogue_gap = 1.5):
+    def stitch_audio(self, audio_file_paths, dialogue_gap = STITCH_GAP):
         final_audio = AudioSegment.silent(duration=.1)
         for audio_path in audio_file_paths:
             final_audio += AudioSegment.from_mp3(audio_path) + AudioSegment.silent(duration=(dialogue_gap * 100.00))
@@ -93,11 +404,47 @@ class Podcast(Polly):
 
         return final_audio
     
+    def stitch_and_upload(self, audio_file_paths, object_path, object_name, dialogue_gap = STITCH_GAP):
+        """
+        Stitch with the NumPy engine and stream the single encode straight to S3.
+        Handles mixed sample rates and evens out loudness between parts.
+        The stream goes to a scratch key first and is only copied over the episode
+        once ffmpeg has exited cleanly, so a failed encode never replaces a good file.
+        """
+        from audio_engine import PcmEngine
+
+        engine = PcmEngine()
+        buffer = engine.render(audio_file_paths, dialogue_gap * 100.00)
+        self.audio_seconds = len(buffer) / engine.sample_rate
+        s3_object_name = f"{object_path}/{object_name}"
+        scratch_key = f"{self.s3_parent_path}/podcast-parts/{self.podcast_name}/{os.path.basename(self.work_dir)}/encoded.mp3"
+        try:
+            engine.encode_stream(
+                buffer,
+                lambda stream: self.s3.upload_fileobj(stream, self.bucket_name, scratch_key,
+                                                      ExtraArgs={'ContentType': 'audio/mpeg'})
+            )
+            self.s3.copy_object(
+                Bucket=self.bucket_name,
+                Key=s3_object_name,
+                CopySource={'Bucket': self.bucket_name, 'Key': scratch_key},
+                ContentType='audio/mpeg',
+                MetadataDirective='REPLACE'
+            )
+            print(f"Uploaded {object_name} to s3://{self.bucket_name}/{s3_object_name}")
+            return f"s3://{self.bucket_name}/{s3_object_name}"
+        except Exception as e:
+            print(f"Upload failed: {e}")
+        finally:
+            try:
+                self.s3.delete_object(Bucket=self.bucket_name, Key=scratch_key)
+            except Exception as e:
+                print(f"Failed to delete {scratch_key}: {e}")
+
     def upload_to_s3(self, file_path, bucket_name, object_path, object_name):
         try:
-            s3 = boto3.client('s3')
             s3_object_name = f"{object_path}/{object_name}"
-            s3.upload_file(file_path, bucket_name, s3_object_name)
+            self.s3.upload_file(file_path, bucket_name, s3_object_name)
             url = f'''https://{bucket_name}.s3.amazonaws.com/{urllib.parse.quote(s3_object_name, safe="~()*!.'")}'''
             print(f"Uploaded {file_path} to {url}")
             return f"s3://{bucket_name}/{object_path}/{object_name}"
@@ -1,14 +1,45 @@
 import boto3
+import codecs
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timezone
 from mimetypes import guess_type
 
+# S3 DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+READ_WORKERS = 8
+READ_CHUNK_SIZE = 64 * 1024
+# Default caps on document text sent with a chat request (overridable in .env)
+DOC_MAX_BYTES = 200_000
+REQUEST_MAX_BYTES = 600_000
+BYTES_PER_TOKEN = 4
+SAMPLE_WINDOWS = 8
+# How oversized documents are cut down: "head_tail" or "sample" (DOC_TRUNCATION in .env)
+DOC_TRUNCATION = "head_tail"
+TRUNCATION_STRATEGIES = ("head_tail", "sample")
+
 class ObjectStorage:
-    def __init__(self):
+    def __init__(self, s3_client=None):
         import load_environment
         self.env = load_environment.load_env()
-        self.s3 = boto3.client('s3')
+        self.s3 = s3_client or boto3.client('s3')
         self.bucket_name = self.env['S3_BUCKET_NAME']
         self.s3_parent_path = self.env['S3_PARENT_FOLDER']
+        self.doc_max_bytes = self._byte_cap('DOC_MAX_BYTES', 'DOC_MAX_TOKENS', DOC_MAX_BYTES)
+        self.request_max_bytes = self._byte_cap('REQUEST_MAX_BYTES', 'REQUEST_MAX_TOKENS', REQUEST_MAX_BYTES)
+        self.doc_truncation = self.env.get('DOC_TRUNCATION') or DOC_TRUNCATION
+        if self.doc_truncation not in TRUNCATION_STRATEGIES:
+            raise ValueError(f"DOC_TRUNCATION must be one of {', '.join(TRUNCATION_STRATEGIES)}, not '{self.doc_truncation}'")
+
+    def _byte_cap(self, bytes_var, tokens_var, default):
+        """Byte cap from .env, tightened by the token cap (~4 bytes per token) when set"""
+        cap = int(self.env.get(bytes_var) or default)
+        if self.env.get(tokens_var):
+            cap = min(cap, int(self.env[tokens_var]) * BYTES_PER_TOKEN)
+        return cap
+
+    def per_doc_bytes(self, doc_count):
+        """Byte cap for each of doc_count documents sent together in one chat request"""
+        return min(self.doc_max_bytes, self.request_max_bytes // max(1, doc_count))
 
     def document_upload(self, file_obj, rel_obj_path, filename):
         try:
@@ -33,15 +64,143 @@ class ObjectStorage:
             return False, error_msg
 
     def document_delete(self, rel_obj_path):
-        response = self.s3.delete_object(Bucket=self.bucket_name, Key=f"{self.s3_parent_path}/{rel_obj_path}")
-        status_code = response['ResponseMetadata']['HTTPStatusCode']
-        print(f"Delete: {self.bucket_name}/{self.s3_parent_path}/{rel_obj_path}")
-        print(f"Status code: {status_code}")
+        result = self.delete_objects([rel_obj_path])[rel_obj_path]
+        return result['success']
+
+    def delete_objects(self, rel_obj_paths):
+        """
+        Delete many objects with batched DeleteObjects calls (up to 1000 keys each).
+        Returns {rel_obj_path: {"success": bool, "error": str | None}}
+        """
+        results = {}
+        key_to_path = {f"{self.s3_parent_path}/{path}": path for path in rel_obj_paths}
+        keys = list(key_to_path)
+
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            batch = keys[start:start + DELETE_BATCH_SIZE]
+            try:
+                response = self.s3.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': False}
+                )
+            except Exception as e:
+                for key in batch:
+                    results[key_to_path[key]] = {"success": False, "error": str(e)}
+                continue
+
+            for deleted in response.get('Deleted', []):
+                results[key_to_path[deleted['Key']]] = {"success": True, "error": None}
+            for error in response.get('Errors', []):
+                results[key_to_path[error['Key']]] = {"success": False, "error": error.get('Message', error.get('Code'))}
+
+        deleted_count = sum(1 for result in results.values() if result['success'])
+        print(f"Delete: {deleted_count}/{len(keys)} objects from {self.bucket_name}/{self.s3_parent_path}")
+        return results
+
+    def iter_text(self, bucket, key, start=0, end=None, chunk_size=READ_CHUNK_SIZE):
+        """
+        Stream an object (or the inclusive byte range start..end) as decoded text.
+        Multi-byte characters split across chunks or range edges are handled by an
+        incremental decoder, so only one chunk is held in memory at a time.
+        """
+        get_kwargs = {"Bucket": bucket, "Key": key}
+        if start or end is not None:
+            get_kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = self.s3.get_object(**get_kwargs)
+
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        for chunk in response['Body'].iter_chunks(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+
+    def read_text(self, bucket, key, max_bytes=None, strategy=None):
+        """
+        Read an object as text, never downloading more than max_bytes of it.
+        Larger objects are truncated with byte-range requests: "head_tail" keeps the
+        start and end, "sample" keeps evenly spaced windows (default: DOC_TRUNCATION).
+        Returns (text, truncated).
+        """
+        max_bytes = max_bytes or self.doc_max_bytes
+        strategy = strategy or self.doc_truncation
+        size = self.s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+        if size == 0:
+            return "", False
+        if size <= max_bytes:
+            return "".join(self.iter_text(bucket, key)), False
 
+        if strategy == "sample":
+            window = max(1, max_bytes // SAMPLE_WINDOWS)
+            step = (size - window) / (SAMPLE_WINDOWS - 1)
+            ranges = [(round(i * step), round(i * step) + window - 1) for i in range(SAMPLE_WINDOWS)]
+        else:
+            half = max(1, max_bytes // 2)
+            ranges = [(0, half - 1), (size - half, size - 1)]
 
-    def read_file(self, bucket, key):
-        response = self.s3.get_object(Bucket=bucket, Key=key)
-        return response['Body'].read()
+        pieces = ["".join(self.iter_text(bucket, key, start, end)) for start, end in ranges]
+        marker = f"\n\n[... truncated: showing {max_bytes} of {size} bytes ...]\n\n"
+        return marker.join(pieces), True
+
+    def _read_concurrently(self, read, objects, max_workers):
+        """Run read(bucket, key) over many objects; failures come back as the exception"""
+        def run(item):
+            bucket, key = item
+            try:
+                return key, read(bucket, key)
+            except Exception as e:
+                return key, e
+
+        if not objects:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(objects))) as pool:
+            return dict(pool.map(run, objects))
+
+    def read_texts(self, objects, max_bytes=None, strategy=None, max_workers=READ_WORKERS):
+        """
+        Concurrent, size-capped read_text over many (bucket, key) pairs.
+        Returns {key: (text, truncated)} with the exception in place for failed reads.
+        """
+        return self._read_concurrently(
+            lambda bucket, key: self.read_text(bucket, key, max_bytes, strategy), objects, max_workers)
+
+    def _object_info(self, obj):
+        key = obj['Key']
+        name = key.split('/')[-1] or key 
+        mime, _ = guess_type(name)
+        return {
+            "id": obj.get('ETag', '').strip('"'),
+            "name": name,
+            "size": obj['Size'],
+            "type": mime or "application/octet-stream",
+            "uploaded_at": obj['LastModified'].astimezone(timezone.utc).isoformat(),
+            "url": f"https://{self.bucket_name}.s3.amazonaws.com/{key}",
+            "uri": f"s3://{self.bucket_name}/{key}",
+            "path": f"{key}",
+            "bucket": f"{self.bucket_name}"
+        }
+
+    def get_objects_by_folder(self):
+        """
+        List every logical folder under the parent path in a single paginated pass.
+        Returns {folder: [object info, ...]} for objects directly inside each folder.
+        """
+        try:
+            folders = {}
+            prefix = f"{self.s3_parent_path}/"
+            paginator = self.s3.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+                for obj in page.get('Contents', []):
+                    parts = obj['Key'][len(prefix):].split('/')
+                    # Only "folder/name" keys; deeper keys (manifests, task parts) are internal
+                    if len(parts) != 2 or not parts[1]:
+                        continue
+                    folders.setdefault(parts[0], []).append(self._object_info(obj))
+            return folders
+        except Exception as e:
+            raise RuntimeError(f"Failed to list s3 bucket: {e}") from e
 
     def get_objects(self, rel_obj_path: str = ""):
         try:
@@ -52,24 +211,11 @@ class ObjectStorage:
                 paginate_kwargs["Prefix"] = f"{self.s3_parent_path}/{rel_obj_path}"
             else:
                 paginate_kwargs["Prefix"] = f"{self.s3_parent_path}"
-            print(f"Getting objects from {paginate_kwargs["Prefix"]}")
+            print(f"Getting objects from {paginate_kwargs['Prefix']}")
             paginator = self.s3.get_paginator('list_objects_v2')
             for page in paginator.paginate(**paginate_kwargs): # Object suggestion was claude
                 for obj in page.get('Contents', []):
-                    key = obj['Key']
-                    name = key.split('/')[-1] or key 
-                    mime, _ = guess_type(name)
-                    files.append({
-                        "id": obj.get('ETag', '').strip('"'),
-                        "name": name,
-                        "size": obj['Size'],
-                        "type": mime or "application/octet-stream",
-                        "uploaded_at": obj['LastModified'].astimezone(timezone.utc).isoformat(),
-                        "url": f"https://{self.bucket_name}.s3.amazonaws.com/{key}",
-                        "uri": f"s3://{self.bucket_name}/{key}",
-                        "path": f"{key}",
-                        "bucket": f"{self.bucket_name}"
-                    })
+                    files.append(self._object_info(obj))
             return files
         except Exception as e:
             raise RuntimeError(f"Failed to list s3 bucket: {e}") from e
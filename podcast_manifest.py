@@ -0,0 +1,126 @@
+import boto3
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+# Jobs currently rendering in this process, keyed by script hash
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def script_hash(dialogue_json, voice_map, dialogue_gap, audio_format, audio_engine):
+    """
+    Stable hash of everything that determines the finished audio.
+    The dialogue is re-serialized so whitespace/key-order differences between
+    retried tool calls still map to the same episode.
+    """
+    dialogue = json.loads(dialogue_json) if isinstance(dialogue_json, str) else dialogue_json
+    payload = json.dumps({
+        "dialogue": dialogue,
+        "voices": voice_map,
+        "gap": dialogue_gap,
+        "format": audio_format,
+        "engine": audio_engine
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PodcastManifest:
+    """
+    Maps script hashes to finished podcast objects in S3 so repeated requests
+    for the same episode reuse the existing upload instead of re-rendering it.
+    The object's ETag is recorded so an upload that has since been replaced is
+    not mistaken for this script's audio.
+    """
+    def __init__(self, s3_client=None):
+        import load_environment
+        self.env = load_environment.load_env()
+        self.s3 = s3_client or boto3.session.Session().client('s3', endpoint_url=self.env.get('S3_ENDPOINT_URL'))
+        self.bucket_name = self.env['S3_BUCKET_NAME']
+        self.s3_parent_path = self.env['S3_PARENT_FOLDER']
+
+    def manifest_key(self, key):
+        return f"{self.s3_parent_path}/manifests/{key}.json"
+
+    def lookup(self, key):
+        """Return the manifest entry for key if its podcast object still exists unchanged, else None"""
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=self.manifest_key(key))
+            entry = json.loads(response['Body'].read())
+            head = self.s3.head_object(Bucket=self.bucket_name, Key=entry['key'])
+            # Another script rendered under the same title overwrites the object; its ETag changes
+            if head.get('ETag') != entry.get('etag'):
+                print(f"Manifest {key[:12]} is stale: {entry['key']} was overwritten")
+                return None
+            return entry
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        except Exception as e:
+            # A missing podcast object (404 on head) or unreadable manifest means re-render
+            print(f"Manifest lookup miss for {key}: {e}")
+            return None
+
+    def record(self, key, podcast_name, url):
+        """
+        Write the manifest entry for a finished upload. Best effort: the podcast is
+        already in S3, so a failure here is logged and only costs a later re-render.
+        """
+        object_key = url.split(f"s3://{self.bucket_name}/", 1)[-1]
+        try:
+            head = self.s3.head_object(Bucket=self.bucket_name, Key=object_key)
+            entry = {
+                "hash": key,
+                "podcast_name": podcast_name,
+                "url": url,
+                "key": object_key,
+                "etag": head.get('ETag'),
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }
+            self.s3.put_object(
+                Bucket=self.bucket_name,
+                Key=self.manifest_key(key),
+                Body=json.dumps(entry).encode("utf-8"),
+                ContentType="application/json"
+            )
+            return entry
+        except Exception as e:
+            print(f"Could not record manifest {key[:12]} for {url}: {e}")
+            return None
+
+    def get_or_create(self, key, podcast_name, create_fn):
+        """
+        Return (url, reused). Reuses a finished upload when one exists, waits on an
+        identical job that is already running, and otherwise runs create_fn once.
+        """
+        with _inflight_lock:
+            future = _inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                _inflight[key] = future
+
+        if not owner:
+            print(f"Waiting on in-flight podcast job {key[:12]}")
+            return future.result(), True
+
+        try:
+            entry = self.lookup(key)
+            if entry:
+                print(f"Reusing existing podcast {entry['url']}")
+                future.set_result(entry['url'])
+                return entry['url'], True
+
+            url = create_fn()
+            if not url:
+                raise RuntimeError(f"Podcast '{podcast_name}' was not uploaded")
+            self.record(key, podcast_name, url)
+            future.set_result(url)
+            return url, False
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
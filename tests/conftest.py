@@ -0,0 +1,156 @@
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+# Tests import the top-level modules directly, as the app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import load_environment
+
+TEST_ENV = {"S3_BUCKET_NAME": "test-bucket", "S3_PARENT_FOLDER": "app"}
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+    def iter_chunks(self, chunk_size):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+
+class FakeS3:
+    """In-memory stand-in for the slice of the boto3 S3 client the app uses"""
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+        self.get_calls = []
+
+    def _missing(self, key):
+        return ClientError({"Error": {"Code": "404", "Message": f"{key} not found"}}, "HeadObject")
+
+    def put(self, key, data):
+        self.objects[key] = data
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.put(Key, Body)
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        self.put(key, fileobj.read())
+
+    def upload_file(self, file_path, bucket, key):
+        with open(file_path, "rb") as f:
+            self.put(key, f.read())
+
+    def download_file(self, bucket, key, file_path):
+        if key not in self.objects:
+            raise self._missing(key)
+        with open(file_path, "wb") as f:
+            f.write(self.objects[key])
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self._missing(Key)
+        data = self.objects[Key]
+        return {"ContentLength": len(data), "ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def get_object(self, Bucket, Key, Range=None):
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        self.get_calls.append((Key, Range))
+        data = self.objects[Key]
+        if Range:
+            start, end = Range[len("bytes="):].split("-")
+            data = data[int(start):(int(end) + 1 if end else None)]
+        return {"Body": FakeBody(data)}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        source = CopySource["Key"]
+        if source not in self.objects:
+            raise self._missing(source)
+        self.put(Key, self.objects[source])
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def delete_objects(self, Bucket, Delete):
+        deleted = []
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+            deleted.append({"Key": obj["Key"]})
+        return {"Deleted": deleted}
+
+    def list_objects_v2(self, Bucket, Prefix="", **kwargs):
+        return {"Contents": [{"Key": key, "Size": len(data)}
+                             for key, data in sorted(self.objects.items()) if key.startswith(Prefix)]}
+
+    def get_paginator(self, name):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                yield s3.list_objects_v2(**kwargs)
+        return Paginator()
+
+
+class FakePolly:
+    """Stand-in Polly client; synthesis tasks write their output into a FakeS3"""
+    def __init__(self, s3=None, statuses=None):
+        self.s3 = s3
+        self.speech_calls = []
+        self.tasks = {}
+        # task index -> list of statuses returned by successive polls (last one repeats)
+        self.statuses = statuses or {}
+
+    def describe_voices(self):
+        return {"Voices": []}
+
+    def synthesize_speech(self, **kwargs):
+        self.speech_calls.append(kwargs)
+        return {"AudioStream": io.BytesIO(kwargs["Text"].encode("utf-8"))}
+
+    def start_speech_synthesis_task(self, **kwargs):
+        index = len(self.tasks)
+        task_id = f"task-{index}"
+        key = f"{kwargs['OutputS3KeyPrefix']}.{task_id}.mp3"
+        self.tasks[task_id] = {
+            "index": index,
+            "key": key,
+            "text": kwargs["Text"],
+            "polls": list(self.statuses.get(index, ["completed"])),
+            "uri": f"https://s3.us-east-1.amazonaws.com/{kwargs['OutputS3BucketName']}/{key}"
+        }
+        return {"SynthesisTask": {"TaskId": task_id, "TaskStatus": "scheduled"}}
+
+    def get_speech_synthesis_task(self, TaskId):
+        task = self.tasks[TaskId]
+        status = task["polls"].pop(0) if len(task["polls"]) > 1 else task["polls"][0]
+        if status == "error":
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "GetSpeechSynthesisTask")
+        if status == "completed" and self.s3 is not None:
+            self.s3.put(task["key"], task["text"].encode("utf-8"))
+        response = {"TaskId": TaskId, "TaskStatus": status, "OutputUri": task["uri"]}
+        if status == "failed":
+            response["TaskStatusReason"] = "boom"
+        return {"SynthesisTask": response}
+
+
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setattr(load_environment, "load_env", lambda: dict(TEST_ENV))
+    return TEST_ENV
+
+
+@pytest.fixture
+def s3():
+    return FakeS3()
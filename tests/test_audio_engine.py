@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+import audio_engine
+from audio_engine import PcmEngine
+from conftest import FakePolly
+
+
+class CatEngine(PcmEngine):
+    """Stand-in that swaps ffmpeg for cat so the pipe handling runs without ffmpeg"""
+    def _encode_command(self, audio_format, output="pipe:1"):
+        return ["cat"]
+
+
+class FailingEncodeEngine(PcmEngine):
+    """Emits some output, then exits non-zero like a failed ffmpeg encode"""
+    def _encode_command(self, audio_format, output="pipe:1"):
+        return ["sh", "-c", "cat; exit 3"]
+
+
+def test_encode_stream_returns_consumer_result():
+    buffer = np.zeros(1000, dtype=np.float32)
+    assert CatEngine().encode_stream(buffer, lambda stream: len(stream.read())) == 2000
+
+
+def test_encode_stream_consumer_failure_does_not_hang():
+    # Large enough to fill the pipe buffers once the consumer stops reading
+    buffer = np.zeros(4_000_000, dtype=np.float32)
+
+    def failing_upload(stream):
+        stream.read(1024)
+        raise RuntimeError("upload failed")
+
+    with pytest.raises(RuntimeError, match="upload failed"):
+        CatEngine().encode_stream(buffer, failing_upload)
+
+
+def test_encode_stream_reports_encoder_failure():
+    buffer = np.zeros(1000, dtype=np.float32)
+    with pytest.raises(RuntimeError, match="exit code 3"):
+        FailingEncodeEngine().encode_stream(buffer, lambda stream: stream.read())
+
+
+def make_podcast(s3, tmp_path, engine_class, monkeypatch):
+    from generate_audio import Podcast
+
+    class StubRenderEngine(engine_class):
+        def render(self, audio_file_paths, dialogue_gap_ms, **kwargs):
+            return np.full(2400, 0.1, dtype=np.float32)
+
+    monkeypatch.setattr(audio_engine, "PcmEngine", StubRenderEngine)
+    pod = Podcast("episode", polly_client=FakePolly(), s3_client=s3)
+    pod.work_dir = str(tmp_path)
+    return pod
+
+
+def test_stitch_and_upload_failed_encode_keeps_existing_episode(env, s3, tmp_path, monkeypatch):
+    s3.put("app/podcasts/episode", b"good audio")
+    pod = make_podcast(s3, tmp_path, FailingEncodeEngine, monkeypatch)
+
+    assert pod.stitch_and_upload([], "app/podcasts", "episode") is None
+    assert s3.objects == {"app/podcasts/episode": b"good audio"}
+
+
+def test_stitch_and_upload_replaces_episode_after_clean_encode(env, s3, tmp_path, monkeypatch):
+    s3.put("app/podcasts/episode", b"old audio")
+    pod = make_podcast(s3, tmp_path, CatEngine, monkeypatch)
+
+    assert pod.stitch_and_upload([], "app/podcasts", "episode") == "s3://test-bucket/app/podcasts/episode"
+    assert list(s3.objects) == ["app/podcasts/episode"]
+    assert len(s3.objects["app/podcasts/episode"]) == 4800
+
+
+class ArrayEngine(PcmEngine):
+    """Decodes 'files' that are really keys into a dict of int16 arrays"""
+    def __init__(self, parts, **kwargs):
+        super().__init__(sample_rate=1000, **kwargs)
+        self.parts = parts
+
+    def decode_to_raw(self, audio_path, raw_path):
+        samples = self.parts[audio_path]
+        samples.astype(np.int16).tofile(raw_path)
+        return len(samples)
+
+
+def tone(length, amplitude):
+    return np.full(length, amplitude, dtype=np.int16)
+
+
+def test_render_places_parts_at_gap_offsets():
+    engine = ArrayEngine({"a": tone(300, 1000), "b": tone(200, 2000)}, crossfade_ms=0)
+
+    buffer = engine.render(["a", "b"], dialogue_gap_ms=150, lead_ms=10, normalize=False, remove_sources=False)
+
+    # lead + part a + gap + part b + gap
+    assert buffer.dtype == np.float32
+    assert len(buffer) == 10 + 300 + 150 + 200 + 150
+    assert np.all(buffer[:10] == 0)
+    assert np.allclose(buffer[10:310], 1000 / 32768)
+    assert np.all(buffer[310:460] == 0)
+    assert np.allclose(buffer[460:660], 2000 / 32768)
+    assert np.all(buffer[660:] == 0)
+
+
+def test_render_normalizes_each_part_to_target_level():
+    engine = ArrayEngine({"quiet": tone(500, 500), "loud": tone(500, 8000)}, crossfade_ms=0)
+
+    buffer = engine.render(["quiet", "loud"], dialogue_gap_ms=0, normalize=True, remove_sources=False)
+
+    target = 10 ** (engine.target_dbfs / 20)
+    assert np.allclose(buffer[:500], target, rtol=1e-4)
+    assert np.allclose(buffer[500:], target, rtol=1e-4)
+
+
+def test_normalize_limits_gain_to_avoid_clipping():
+    samples = np.zeros(1000, dtype=np.float32)
+    samples[0] = 0.5
+    PcmEngine(target_dbfs=-3.0).normalize(samples)
+    assert np.isclose(np.max(np.abs(samples)), 1.0)
+
+
+def test_render_fades_part_edges():
+    engine = ArrayEngine({"a": tone(100, 16384)}, crossfade_ms=10)
+
+    buffer = engine.render(["a"], dialogue_gap_ms=0, normalize=False, remove_sources=False)
+
+    assert buffer[0] == 0
+    assert np.all(np.diff(buffer[:10]) > 0)
+    assert np.allclose(buffer[10:90], 0.5)
+    assert buffer[99] == 0
+
+
+def test_render_without_gap_crossfades_neighbours():
+    engine = ArrayEngine({"a": tone(100, 16384), "b": tone(100, 16384)}, crossfade_ms=10)
+
+    buffer = engine.render(["a", "b"], dialogue_gap_ms=0, normalize=False, remove_sources=False)
+
+    # Parts overlap by the 10 sample fade, and the two ramps sum to a steady level
+    assert len(buffer) == 190
+    assert np.allclose(buffer[10:180], 0.5, atol=1e-3)
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from batch_podcasts import load_completed, load_jobs
+
+DIALOGUE = [{"speaker": "host", "text": "Hi"}, {"speaker": "guest", "text": "Hello"}]
+OTHER_DIALOGUE = [{"speaker": "host", "text": "Bye"}]
+
+
+def write_jobs(tmp_path, *jobs):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text("\n".join(json.dumps(job) for job in jobs) + "\n\n")
+    return str(path)
+
+
+def test_string_and_list_dialogue_get_the_same_job_id(env, tmp_path):
+    as_list = load_jobs(write_jobs(tmp_path, {"podcast_name": "ep", "dialogue": DIALOGUE}))
+    as_string = load_jobs(write_jobs(tmp_path, {"podcast_name": "ep", "dialogue": json.dumps(DIALOGUE, indent=2)}))
+
+    assert as_list[0]["job_id"] == as_string[0]["job_id"]
+    assert json.loads(as_list[0]["dialogue_json"]) == DIALOGUE
+
+
+def test_repeated_job_is_loaded_once(env, tmp_path):
+    jobs = load_jobs(write_jobs(tmp_path,
+                                {"podcast_name": "ep", "dialogue": DIALOGUE},
+                                {"podcast_name": "ep", "dialogue": json.dumps(DIALOGUE)},
+                                {"podcast_name": "other", "dialogue": OTHER_DIALOGUE}))
+
+    assert [job["podcast_name"] for job in jobs] == ["ep", "other"]
+
+
+def test_same_script_under_two_names_is_rendered_once(env, tmp_path):
+    jobs = load_jobs(write_jobs(tmp_path,
+                                {"podcast_name": "ep", "dialogue": DIALOGUE},
+                                {"podcast_name": "ep-copy", "dialogue": DIALOGUE}))
+
+    assert [job["podcast_name"] for job in jobs] == ["ep"]
+
+
+def test_name_reused_for_a_different_script_is_an_error(env, tmp_path):
+    path = write_jobs(tmp_path,
+                      {"podcast_name": "ep", "dialogue": DIALOGUE},
+                      {"podcast_name": "ep", "dialogue": OTHER_DIALOGUE})
+
+    with pytest.raises(ValueError, match=":2: podcast_name 'ep'"):
+        load_jobs(path)
+
+
+def test_job_missing_fields_is_an_error(env, tmp_path):
+    with pytest.raises(ValueError, match=":1: job needs"):
+        load_jobs(write_jobs(tmp_path, {"podcast_name": "ep"}))
+
+
+def test_load_completed_skips_partial_and_failed_lines(tmp_path):
+    path = tmp_path / "jobs.jsonl.progress.jsonl"
+    path.write_text(
+        json.dumps({"job_id": "a", "status": "done"}) + "\n"
+        + json.dumps({"job_id": "b", "status": "failed"}) + "\n"
+        + '{"job_id": "c", "sta'
+    )
+
+    assert load_completed(str(path)) == {"a"}
+
+
+def test_load_completed_without_progress_file(tmp_path):
+    assert load_completed(str(tmp_path / "missing.jsonl")) == set()
@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+
+from anthropic.types import TextBlock, ToolUseBlock
+
+from chat import Chat
+from conversation_store import ConversationStore
+
+
+def reply(*content, stop_reason="end_turn"):
+    return SimpleNamespace(content=list(content), stop_reason=stop_reason, usage=SimpleNamespace(output_tokens=5))
+
+
+def tool_call(tool_id):
+    return ToolUseBlock(type="tool_use", id=tool_id, name="generate_podcast_audio",
+                        input={"dialogue_json": "[]", "podcast_name": "ep"})
+
+
+class FakeMessages:
+    """Plays back scripted responses: the first through stream(), the rest through create()"""
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def stream(self, **kwargs):
+        self.requests.append(kwargs)
+        response = self.responses.pop(0)
+        texts = [block.text for block in response.content if block.type == "text"]
+
+        class Stream:
+            text_stream = texts
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def get_final_message(self):
+                return response
+        return Stream()
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.responses.pop(0)
+
+
+def make_chat(responses, store=None):
+    chat = Chat(api_key="test", tools=True, store=store, session_id="s")
+    chat.client = SimpleNamespace(messages=FakeMessages(responses))
+    return chat
+
+
+def test_failed_tool_call_is_answered_with_error_result():
+    chat = make_chat([
+        reply(tool_call("t1"), tool_call("t2"), stop_reason="tool_use"),
+        reply(TextBlock(type="text", text="Sorry, that failed.")),
+    ])
+
+    def broken_tool(name, tool_input):
+        raise RuntimeError("upload failed")
+    chat.process_tool_call = broken_tool
+
+    output = "".join(chat.chat_stream("make a podcast"))
+
+    assert "Sorry, that failed." in output
+    tool_results = chat.conversation_history[2]["content"]
+    assert [result["tool_use_id"] for result in tool_results] == ["t1", "t2"]
+    assert all(result["is_error"] for result in tool_results)
+
+
+def test_tool_loop_continues_until_no_more_tool_calls():
+    chat = make_chat([
+        reply(tool_call("t1"), stop_reason="tool_use"),
+        reply(tool_call("t2"), stop_reason="tool_use"),
+        reply(TextBlock(type="text", text="All done.")),
+    ])
+    chat.process_tool_call = lambda name, tool_input: {"success": True}
+
+    output = "".join(chat.chat_stream("make two podcasts"))
+
+    assert output.endswith("All done.")
+    assert [m["role"] for m in chat.conversation_history] == ["user", "assistant", "user", "assistant", "user", "assistant"]
+
+
+def test_legacy_chat_uses_store_handling(capsys):
+    store = ConversationStore(":memory:")
+    chat = make_chat([reply(TextBlock(type="text", text="Hello!"))], store=store)
+
+    chat.chat("hi")
+
+    assert "Claude: Hello!" in capsys.readouterr().out
+    assert store.display_messages("s") == [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"}]
+    restored = Chat(api_key="test", store=store, session_id="s")
+    assert restored.conversation_history == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": [{"type": "text", "text": "Hello!"}]},
+    ]
+
+
+def test_legacy_chat_error_keeps_store_consistent(capsys):
+    store = ConversationStore(":memory:")
+    chat = make_chat([], store=store)
+
+    chat.chat("hi")
+
+    assert "Error:" in capsys.readouterr().out
+    # The prompt stays in memory and on disk alike, so restore matches what was shown
+    assert chat.conversation_history == [{"role": "user", "content": "hi"}]
+    assert store.display_messages("s")[0] == {"role": "user", "content": "hi"}
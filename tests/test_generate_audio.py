@@ -0,0 +1,181 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import generate_audio
+from conftest import FakePolly
+from generate_audio import Podcast, SynthesisTaskError, plan_segments, s3_key_from_uri, split_sentences, ssml_len
+
+SEGMENTS = [
+    {"voice_id": "Ruth", "text": "<speak>one</speak>"},
+    {"voice_id": "Patrick", "text": "<speak>two</speak>"},
+    {"voice_id": "Ruth", "text": "<speak>three</speak>"},
+]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(generate_audio.time, "sleep", delays.append)
+    return delays
+
+
+def make_podcast(s3, tmp_path, polly):
+    pod = Podcast("episode", polly_client=polly, s3_client=s3)
+    pod.work_dir = str(tmp_path)
+    return pod
+
+
+def test_s3_key_from_uri_handles_both_url_styles():
+    assert s3_key_from_uri("https://s3.us-east-1.amazonaws.com/bkt/a/b/.task-1.mp3", "bkt") == "a/b/.task-1.mp3"
+    assert s3_key_from_uri("https://bkt.s3.amazonaws.com/a/my%20part.mp3", "bkt") == "a/my part.mp3"
+    assert s3_key_from_uri("https://bkt.s3.amazonaws.com/bkt/a.mp3", "bkt") == "bkt/a.mp3"
+
+
+def test_wait_for_tasks_backs_off_exponentially(env, s3, sleeps):
+    polly = FakePolly(s3, statuses={0: ["scheduled", "inProgress", "inProgress", "inProgress", "completed"]})
+    pod = Podcast("episode", polly_client=polly, s3_client=s3)
+    task_id = pod.start_synthesis_task("hi", "Ruth", "test-bucket", "app/parts/")
+
+    outputs = pod.wait_for_tasks([task_id], initial_delay=1.0, max_delay=3.0)
+
+    assert sleeps == [1.0, 2.0, 3.0, 3.0]
+    assert outputs == {task_id: polly.tasks[task_id]["uri"]}
+
+
+def test_wait_for_tasks_times_out(env, s3, sleeps):
+    polly = FakePolly(s3, statuses={0: ["inProgress"]})
+    pod = Podcast("episode", polly_client=polly, s3_client=s3)
+    task_id = pod.start_synthesis_task("hi", "Ruth", "test-bucket", "app/parts/")
+
+    with pytest.raises(SynthesisTaskError, match="still running"):
+        pod.wait_for_tasks([task_id], timeout=0)
+
+
+def test_async_segments_download_from_output_uri_and_clean_up(env, s3, tmp_path, sleeps):
+    polly = FakePolly(s3, statuses={1: ["inProgress", "completed"]})
+    pod = make_podcast(s3, tmp_path, polly)
+
+    paths = pod.synthesize_segments_async(SEGMENTS)
+
+    assert [open(path).read() for path in paths] == [segment["text"] for segment in SEGMENTS]
+    # Polly's own key naming (prefix + "." + task id) was followed, then the parts removed
+    assert all("/." in task["key"] for task in polly.tasks.values())
+    assert s3.objects == {}
+
+
+@pytest.mark.parametrize("statuses", [
+    # A task fails while another is still rendering and finishes afterwards
+    {0: ["completed"], 1: ["failed"], 2: ["inProgress", "inProgress", "completed"]},
+    # Polling itself throws (e.g. throttling)
+    {0: ["completed"], 1: ["error", "completed"], 2: ["completed"]},
+])
+def test_async_failure_leaves_no_parts(env, s3, tmp_path, sleeps, statuses):
+    pod = make_podcast(s3, tmp_path, FakePolly(s3, statuses=statuses))
+
+    with pytest.raises((SynthesisTaskError, ClientError)):
+        pod.synthesize_segments_async(SEGMENTS)
+
+    assert s3.objects == {}
+
+
+def test_async_start_failure_cleans_up_started_tasks(env, s3, tmp_path, sleeps):
+    polly = FakePolly(s3, statuses={0: ["inProgress", "completed"]})
+    start = polly.start_speech_synthesis_task
+
+    def start_then_fail(**kwargs):
+        if polly.tasks:
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "StartSpeechSynthesisTask")
+        return start(**kwargs)
+
+    polly.start_speech_synthesis_task = start_then_fail
+    pod = make_podcast(s3, tmp_path, polly)
+
+    with pytest.raises(ClientError):
+        pod.synthesize_segments_async(SEGMENTS)
+
+    # The started task was waited on until it wrote its part, and that part was deleted
+    assert polly.tasks["task-0"]["polls"] == ["completed"]
+    assert s3.objects == {}
+
+
+def test_plan_segments_merges_a_speakers_turn():
+    dialogue = [
+        {"speaker": "host", "text": "Welcome."},
+        {"speaker": "host", "text": "Today we talk about rivers."},
+        {"speaker": "guest", "text": "Thanks for having me."},
+        {"speaker": "host", "text": "Let's begin."},
+    ]
+
+    segments = plan_segments(dialogue, 150)
+
+    assert segments == [
+        {"voice_id": "Ruth", "text": '<speak>Welcome.<break time="150ms"/>Today we talk about rivers.</speak>'},
+        {"voice_id": "Patrick", "text": "<speak>Thanks for having me.</speak>"},
+        {"voice_id": "Ruth", "text": "<speak>Let's begin.</speak>"},
+    ]
+
+
+def test_plan_segments_respects_the_request_budget():
+    dialogue = [{"speaker": "host", "text": "Sentence number %d is here." % i} for i in range(40)]
+
+    segments = plan_segments(dialogue, 150, max_chars=200)
+
+    assert len(segments) > 1
+    assert all(len(segment["text"]) <= 200 for segment in segments)
+    assert all(segment["voice_id"] == "Ruth" for segment in segments)
+    spoken = "".join(segment["text"] for segment in segments)
+    assert all(f"Sentence number {i} is here." in spoken for i in range(40))
+
+
+def test_plan_segments_escapes_without_splitting_entities():
+    # No spaces, so the line is hard cut; a cut after escaping could split "&amp;"
+    dialogue = [{"speaker": "guest", "text": "R&D<and>Q&A" * 30}]
+
+    segments = plan_segments(dialogue, 150, max_chars=100)
+
+    for segment in segments:
+        assert len(segment["text"]) <= 100
+        body = segment["text"][len("<speak>"):-len("</speak>")]
+        # Every & starts a whole entity and no raw markup leaks through
+        assert "<" not in body and ">" not in body
+        assert body.count("&") == body.count("&amp;") + body.count("&lt;") + body.count("&gt;")
+
+
+def test_plan_segments_long_line_continues_without_a_pause():
+    # Sentence and word cuts leave chunks short enough to share a request
+    dialogue = [{"speaker": "host", "text": "Hi. Tiny " + "x" * 70}, {"speaker": "host", "text": "Next."}]
+
+    segments = plan_segments(dialogue, 150, max_chars=80)
+
+    assert [segment["text"] for segment in segments] == [
+        "<speak>Hi. Tiny</speak>",
+        "<speak>" + "x" * 65 + "</speak>",
+        '<speak>xxxxx<break time="150ms"/>Next.</speak>',
+    ]
+
+
+def test_plan_segments_rejects_unknown_speakers():
+    with pytest.raises(Exception, match="unknown speaker"):
+        plan_segments([{"speaker": "narrator", "text": "Once upon a time."}], 150)
+
+
+def test_split_sentences_measures_escaped_length():
+    chunks = split_sentences("&" * 50, 20, measure=ssml_len)
+
+    assert [len(chunk) for chunk in chunks] == [4] * 12 + [2]
+
+
+def test_polly_chars_counts_spoken_text_not_markup(env, s3, tmp_path):
+    pod = make_podcast(s3, tmp_path, FakePolly(s3))
+    dialogue = [{"speaker": "host", "text": "Q&A"}, {"speaker": "host", "text": "Done."}]
+
+    def stop(segments):
+        raise RuntimeError("stop before stitching")
+    pod.synthesize_segments = stop
+
+    with pytest.raises(RuntimeError):
+        pod.create_podcast(json.dumps(dialogue))
+
+    assert pod.polly_chars == len("Q&A") + len("Done.")
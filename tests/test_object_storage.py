@@ -0,0 +1,104 @@
+import pytest
+
+import load_environment
+from conftest import TEST_ENV
+from object_storage import ObjectStorage
+
+
+@pytest.fixture
+def make_storage(monkeypatch, s3):
+    def make(**env):
+        monkeypatch.setattr(load_environment, "load_env", lambda: {**TEST_ENV, **env})
+        return ObjectStorage(s3_client=s3)
+    return make
+
+
+def requested_bytes(s3):
+    total = 0
+    for _, byte_range in s3.get_calls:
+        start, end = byte_range[len("bytes="):].split("-")
+        total += int(end) - int(start) + 1
+    return total
+
+
+def test_small_file_is_read_whole(make_storage, s3):
+    storage = make_storage()
+    s3.put("doc.txt", b"short document")
+
+    assert storage.read_text("test-bucket", "doc.txt", max_bytes=100) == ("short document", False)
+    assert s3.get_calls == [("doc.txt", None)]
+
+
+def test_empty_file(make_storage, s3):
+    storage = make_storage()
+    s3.put("empty.txt", b"")
+
+    assert storage.read_text("test-bucket", "empty.txt") == ("", False)
+    assert s3.get_calls == []
+
+
+def test_head_tail_keeps_both_ends(make_storage, s3):
+    storage = make_storage()
+    s3.put("doc.txt", b"A" * 50 + b"x" * 900 + b"Z" * 50)
+
+    text, truncated = storage.read_text("test-bucket", "doc.txt", max_bytes=100)
+
+    assert truncated
+    head, tail = text.split("\n\n[... truncated: showing 100 of 1000 bytes ...]\n\n")
+    assert head == "A" * 50 and tail == "Z" * 50
+    assert s3.get_calls == [("doc.txt", "bytes=0-49"), ("doc.txt", "bytes=950-999")]
+
+
+def test_sample_windows_span_the_file(make_storage, s3):
+    storage = make_storage(DOC_TRUNCATION="sample")
+    s3.put("doc.txt", bytes(range(256)) * 4)
+
+    _, truncated = storage.read_text("test-bucket", "doc.txt", max_bytes=80)
+
+    assert truncated
+    ranges = [byte_range for _, byte_range in s3.get_calls]
+    assert len(ranges) == 8
+    assert ranges[0] == "bytes=0-9" and ranges[-1] == "bytes=1014-1023"
+    assert requested_bytes(s3) == 80
+
+
+def test_cut_multibyte_characters_are_dropped(make_storage, s3):
+    storage = make_storage()
+    # "é" is two bytes, so both range edges land inside a character
+    s3.put("doc.txt", "é".encode("utf-8") * 100)
+
+    text, truncated = storage.read_text("test-bucket", "doc.txt", max_bytes=51)
+
+    assert truncated
+    head, tail = text.split("\n\n[... truncated: showing 51 of 200 bytes ...]\n\n")
+    assert head == "é" * 12 and tail == "é" * 12
+
+
+def test_unknown_truncation_strategy_is_rejected(make_storage):
+    with pytest.raises(ValueError, match="DOC_TRUNCATION"):
+        make_storage(DOC_TRUNCATION="middle")
+
+
+def test_request_cap_is_split_between_documents(make_storage):
+    storage = make_storage(DOC_MAX_BYTES="1000", REQUEST_MAX_BYTES="3000")
+
+    assert storage.per_doc_bytes(1) == 1000
+    assert storage.per_doc_bytes(3) == 1000
+    assert storage.per_doc_bytes(6) == 500
+
+
+def test_token_caps_tighten_byte_caps(make_storage):
+    storage = make_storage(DOC_MAX_BYTES="1000", DOC_MAX_TOKENS="100", REQUEST_MAX_TOKENS="150")
+
+    assert storage.doc_max_bytes == 400
+    assert storage.per_doc_bytes(2) == 300
+
+
+def test_read_texts_reports_failures_per_key(make_storage, s3):
+    storage = make_storage()
+    s3.put("a.txt", b"alpha")
+
+    results = storage.read_texts([("test-bucket", "a.txt"), ("test-bucket", "missing.txt")], max_bytes=100)
+
+    assert results["a.txt"] == ("alpha", False)
+    assert isinstance(results["missing.txt"], Exception)
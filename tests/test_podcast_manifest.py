@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+import podcast_manifest
+from generate_audio import Podcast
+from podcast_manifest import PodcastManifest, script_hash
+
+DIALOGUE = '[{"speaker": "host", "text": "Hi"}, {"speaker": "guest", "text": "Hello"}]'
+URL = "s3://test-bucket/app/podcasts/ep.mp3"
+
+
+def test_script_hash_ignores_json_formatting():
+    reformatted = '[ {"text": "Hi", "speaker": "host"},\n {"text": "Hello", "speaker": "guest"} ]'
+    base = script_hash(DIALOGUE, {"host": "Ruth"}, 1.5, "mp3", "pydub")
+
+    assert script_hash(reformatted, {"host": "Ruth"}, 1.5, "mp3", "pydub") == base
+    assert script_hash(DIALOGUE, {"host": "Ruth"}, 1.5, "mp3", "numpy") != base
+    assert script_hash(DIALOGUE, {"host": "Joanna"}, 1.5, "mp3", "pydub") != base
+
+
+def test_script_key_follows_audio_engine():
+    assert Podcast.script_key(DIALOGUE, {}) == Podcast.script_key(DIALOGUE, {"AUDIO_ENGINE": "pydub"})
+    assert Podcast.script_key(DIALOGUE, {}) != Podcast.script_key(DIALOGUE, {"AUDIO_ENGINE": "numpy"})
+
+
+def test_finished_upload_is_reused(env, s3):
+    manifest = PodcastManifest(s3_client=s3)
+
+    def create():
+        s3.put("app/podcasts/ep.mp3", b"audio")
+        return URL
+
+    assert manifest.get_or_create("k", "ep", create) == (URL, False)
+    assert manifest.get_or_create("k", "ep", lambda: pytest.fail("re-rendered")) == (URL, True)
+
+
+def test_overwritten_upload_is_a_miss(env, s3):
+    manifest = PodcastManifest(s3_client=s3)
+    s3.put("app/podcasts/ep.mp3", b"first script")
+    manifest.record("k", "ep", URL)
+
+    s3.put("app/podcasts/ep.mp3", b"another script under the same name")
+
+    assert manifest.lookup("k") is None
+
+
+def test_manifest_write_failure_still_returns_url(env, s3, monkeypatch):
+    manifest = PodcastManifest(s3_client=s3)
+
+    def broken_put(**kwargs):
+        raise RuntimeError("access denied")
+    monkeypatch.setattr(s3, "put_object", broken_put)
+
+    def create():
+        s3.put("app/podcasts/ep.mp3", b"audio")
+        return URL
+
+    assert manifest.get_or_create("k", "ep", create) == (URL, False)
+    assert "k" not in podcast_manifest._inflight
+
+
+def test_concurrent_request_waits_on_in_flight_job(env, s3):
+    manifest = PodcastManifest(s3_client=s3)
+    started = threading.Event()
+    release = threading.Event()
+    renders = []
+
+    def create():
+        renders.append(1)
+        started.set()
+        release.wait(5)
+        s3.put("app/podcasts/ep.mp3", b"audio")
+        return URL
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(manifest.get_or_create("k", "ep", create)))
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(manifest.get_or_create("k", "ep", create)))
+    waiter.start()
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert len(renders) == 1
+    assert sorted(results) == [(URL, False), (URL, True)]
+
+
+def test_failed_job_propagates_to_waiters(env, s3):
+    manifest = PodcastManifest(s3_client=s3)
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def create():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("synthesis failed")
+
+    def request():
+        try:
+            manifest.get_or_create("k", "ep", create)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    owner = threading.Thread(target=request)
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=request)
+    waiter.start()
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert errors == ["synthesis failed", "synthesis failed"]